@@ -1,30 +1,69 @@
 import pandas as pd
 import numpy as np
 from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from typing import Optional, List, Dict, Any, Callable, Literal, Union
+from dataclasses import dataclass
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import os
-import glob
+from pathlib import Path
 from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
+import orjson
+import anyio
 
 # Carrega variáveis
 load_dotenv()
 
-# Determina o caminho correto do arquivo Parquet
-PARQUET_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed", "taxi_clean.parquet")
+# Caminho do Parquet, resolvido uma única vez (relativo à raiz do projeto se não for absoluto)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PARQUET_PATH = (PROJECT_ROOT / os.getenv("PARQUET_PATH", "data/processed/taxi_clean.parquet")).resolve()
+
+# Colunas com menos de 1% de valores distintos recebem índice invertido
+INDEX_CARDINALITY_RATIO = 0.01
+
+# Filtros com limite buscam só as primeiras posições via take quando a tabela tem vários
+# chunks ou, com um único chunk, quando casam mais de 1% das linhas
+TAKE_SELECTIVITY_RATIO = 0.01
+
+# Threads disponíveis para os endpoints com processamento pesado
+THREADPOOL_SIZE = 64
+
+def _json_default(obj: Any) -> Any:
+    """Serializa tipos que o orjson não conhece nativamente"""
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    raise TypeError
+
+class NumpyORJSONResponse(ORJSONResponse):
+    """Resposta orjson que serializa tipos NumPy e chaves não-string em C"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _arrow_response(table: pa.Table) -> Response:
+    """Serializa a tabela como stream IPC do Arrow (binário colunar, sem JSON)"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE)
 
 app = FastAPI(
     title="Taxi Data Analysis API",
     description="API para análise de dados de táxi de NYC",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=NumpyORJSONResponse
 )
 
-# Cache global para dados
-DATA_CACHE = {}
-
 class FilterRequest(BaseModel):
     column: str
     operator: str  # eq, gt, lt, gte, lte, in, between
@@ -36,125 +75,322 @@ class StatsRequest(BaseModel):
     columns: List[str]
     group_by: Optional[str] = None
 
-def load_parquet_data():
-    """Carrega dados do Parquet com tratamento de erros e cache"""
-    global DATA_CACHE
+@dataclass(frozen=True)
+class DatasetMeta:
+    """Metadados do dataset pré-calculados na inicialização"""
+    records_count: int
+    columns: List[str]
+    dtypes: Dict[str, Any]
+    numeric_cols: List[str]
+    datetime_cols: List[str]
+    categorical_cols: List[str]
+    column_stats: Dict[str, Dict[str, Any]]
+    null_counts: Dict[str, int]
+    memory_usage_mb: float
+
+def _is_string(data_type: pa.DataType) -> bool:
+    """Indica se o tipo Arrow é texto"""
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+def _read_parquet(path: str) -> pa.Table:
+    """Lê o Parquet como tabela Arrow mapeada em memória"""
+    # Strings já são lidas codificadas em dicionário; demais tipos vêm do próprio Parquet
+    schema = pq.ParquetDataset(path).schema
+    dictionary_cols = [field.name for field in schema if _is_string(field.type)]
+    return pq.read_table(
+        path,
+        memory_map=True,
+        pre_buffer=True,
+        use_threads=True,
+        read_dictionary=dictionary_cols
+    )
+
+def load_parquet_data() -> pa.Table:
+    """Carrega dados do Parquet configurado em PARQUET_PATH"""
+    if not PARQUET_PATH.exists():
+        raise FileNotFoundError(f"Arquivo Parquet não encontrado: {PARQUET_PATH}")
     
-    if "main_df" in DATA_CACHE:
-        return DATA_CACHE["main_df"]
+    print(f"Lendo Parquet: {PARQUET_PATH}")
+    table = _read_parquet(str(PARQUET_PATH))
     
-    try:
-        # Verifica diferentes possibilidades de localização dos arquivos
-        possible_paths = [
-            PARQUET_PATH,
-            os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "processed"),
-            os.path.join(os.path.dirname(__file__), "..", "data", "processed"),
-            "./data/processed",
-            "../data/processed"
-        ]
+    print(f"Dados carregados: {table.num_rows} registros, {table.num_columns} colunas")
+    print(f"Colunas disponíveis: {table.column_names}")
+    
+    return table
+
+def _count_distinct(column: pa.ChunkedArray) -> int:
+    """Conta valores distintos (sem nulos/NaN) ordenando uma cópia, sem tabela hash"""
+    if pa.types.is_dictionary(column.type):
+        # unique percorre só os índices; conta o nulo como valor
+        return len(pc.unique(column)) - (1 if column.null_count else 0)
+    
+    values = pc.drop_null(column).to_numpy()
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return 0
+    values = np.sort(values)
+    return int(np.count_nonzero(values[1:] != values[:-1]) + 1)
+
+def _build_metadata(table: pa.Table) -> DatasetMeta:
+    """Calcula uma única vez os metadados usados por /health, /columns e /summary"""
+    # Contagem de nulos lida dos metadados de cada chunk, sem varrer os dados
+    null_counts = {col: table.column(col).null_count for col in table.column_names}
+    
+    # Dtypes do pandas obtidos de uma tabela vazia, sem converter os dados;
+    # com nulos, o pandas converte inteiros para float64 e booleanos para object
+    dtypes = table.schema.empty_table().to_pandas().dtypes.to_dict()
+    for field in table.schema:
+        if null_counts[field.name]:
+            if pa.types.is_integer(field.type):
+                dtypes[field.name] = np.dtype('float64')
+            elif pa.types.is_boolean(field.type):
+                dtypes[field.name] = np.dtype('object')
+    numeric_cols = [col for col, dtype in dtypes.items() if pd.api.types.is_numeric_dtype(dtype)]
+    datetime_cols = [col for col, dtype in dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+    categorical_cols = [
+        col for col, dtype in dtypes.items()
+        if dtype == 'object' or isinstance(dtype, pd.CategoricalDtype)
+    ]
+    
+    # Contagens e min/max/mean em uma única passada; valores distintos ficam de fora
+    # porque o count_distinct monta uma tabela hash por coluna ao mesmo tempo
+    aggregations = []
+    for col in table.column_names:
+        aggregations.append((col, "count"))
+        if col in numeric_cols:
+            aggregations += [(col, "min"), (col, "max"), (col, "mean")]
+        elif col in datetime_cols:
+            aggregations += [(col, "min"), (col, "max")]
+    aggregated = table.group_by([]).aggregate(aggregations).to_pylist()[0]
+    
+    column_stats = {}
+    for col in table.column_names:
+        col_info = {
+            "dtype": str(dtypes[col]),
+            "non_null_count": aggregated[f"{col}_count"],
+            "null_count": null_counts[col],
+            # Uma coluna por vez, para limitar o pico de memória na inicialização
+            "unique_count": _count_distinct(table.column(col))
+        }
         
-        df = None
-        for path in possible_paths:
-            try:
-                if os.path.isdir(path):
-                    # Se é um diretório, procura por arquivos parquet
-                    parquet_files = glob.glob(os.path.join(path, "*.parquet"))
-                    if parquet_files:
-                        print(f"Lendo arquivos Parquet do diretório: {path}")
-                        df = pd.read_parquet(path)
-                        break
-                elif os.path.exists(path) and path.endswith('.parquet'):
-                    print(f"Lendo arquivo Parquet: {path}")
-                    df = pd.read_parquet(path)
-                    break
-            except Exception as e:
-                print(f"Erro ao tentar ler {path}: {e}")
-                continue
-        
-        if df is None:
-            # Última tentativa: procurar recursivamente
-            for root, dirs, files in os.walk(os.path.dirname(os.path.dirname(__file__))):
-                for file in files:
-                    if file.endswith('.parquet'):
-                        file_path = os.path.join(root, file)
-                        try:
-                            print(f"Tentando ler arquivo encontrado: {file_path}")
-                            df = pd.read_parquet(file_path)
-                            break
-                        except:
-                            continue
-                if df is not None:
-                    break
-        
-        if df is None:
-            raise FileNotFoundError("Nenhum arquivo Parquet válido encontrado")
-        
-        # Otimizações de tipos de dados
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    # Tenta converter strings para datetime se aplicável
-                    if 'datetime' in col.lower():
-                        df[col] = pd.to_datetime(df[col], errors='ignore')
-                    elif df[col].nunique() < len(df) * 0.5:  # Se tem muitos valores repetidos
-                        df[col] = df[col].astype('category')
-                except:
-                    pass
-        
-        # Cache dos dados
-        DATA_CACHE["main_df"] = df
-        print(f"Dados carregados e cached: {len(df)} registros, {len(df.columns)} colunas")
-        print(f"Colunas disponíveis: {list(df.columns)}")
-        
-        return df
+        # Adiciona estatísticas específicas por tipo
+        if col in numeric_cols:
+            col_info.update({
+                stat: float(aggregated[f"{col}_{stat}"]) if aggregated[f"{col}_{stat}"] is not None else None
+                for stat in ("min", "max", "mean")
+            })
+        elif col in datetime_cols:
+            col_min, col_max = aggregated[f"{col}_min"], aggregated[f"{col}_max"]
+            col_info.update({
+                "min_date": str(col_min) if col_min is not None else None,
+                "max_date": str(col_max) if col_max is not None else None
+            })
+        
+        column_stats[col] = col_info
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {str(e)}")
+    return DatasetMeta(
+        records_count=table.num_rows,
+        columns=table.column_names,
+        dtypes=dtypes,
+        numeric_cols=numeric_cols,
+        datetime_cols=datetime_cols,
+        categorical_cols=categorical_cols,
+        column_stats=column_stats,
+        null_counts=null_counts,
+        memory_usage_mb=table.nbytes / 1024 / 1024
+    )
+
+def _build_indices(table: pa.Table, meta: DatasetMeta):
+    """Pré-calcula value_counts e índices invertidos das colunas de baixa cardinalidade"""
+    value_counts, indices = {}, {}
+    # Posições em int32 enquanto couberem: metade da memória de um índice intp
+    position_type = np.int32 if table.num_rows < 2**31 else np.int64
+    
+    for col in meta.columns:
+        column = table.column(col)
+        # Só colunas dicionário e inteiras; floats de baixa cardinalidade não valem o custo
+        if not (pa.types.is_dictionary(column.type) or pa.types.is_integer(column.type)):
+            continue
+        if meta.column_stats[col]["unique_count"] >= meta.records_count * INDEX_CARDINALITY_RATIO:
+            continue
+        
+        # Códigos por linha direto do Arrow, sem converter a coluna para pandas
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        array = column.combine_chunks()
+        keys = array.dictionary.to_pylist()
+        # Nulos recebem um código extra que fica fora do índice
+        codes = pc.fill_null(array.indices, len(keys)).to_numpy()
+        
+        counts = np.bincount(codes, minlength=len(keys) + 1)[:len(keys)]
+        # Ordenação estável agrupa as posições por valor mantendo a ordem das linhas
+        positions = np.argsort(codes, kind="stable").astype(position_type)
+        groups = np.split(positions, np.cumsum(counts))[:len(keys)]
+        
+        order = np.argsort(-counts, kind="stable")
+        order = order[counts[order] > 0]
+        value_counts[col] = pd.Series(counts[order], index=[keys[i] for i in order], name="count")
+        # Mapeia cada valor para as posições das linhas em que aparece
+        indices[col] = {key: group for key, group, count in zip(keys, groups, counts) if count}
+    
+    return value_counts, indices
+
+@app.on_event("startup")
+def load_dataset():
+    """Carrega o dataset e seus metadados uma única vez na inicialização"""
+    table = load_parquet_data()
+    app.state.table = table
+    app.state.meta = _build_metadata(table)
+    app.state.value_counts, app.state.indices = _build_indices(table, app.state.meta)
+
+@app.on_event("startup")
+async def configure_threadpool():
+    """Amplia o pool de threads usado pelos endpoints com processamento pesado"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+def _to_pandas(columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Converte para pandas apenas as colunas necessárias da tabela em cache"""
+    table = app.state.table
+    if columns is not None:
+        table = table.select(columns)
+    # Mantém os tipos Arrow (dicionário, timestamp, nulos) dentro do pandas
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def _value_type(column: pa.ChunkedArray) -> pa.DataType:
+    """Tipo dos valores da coluna (o tipo do dicionário, se codificada)"""
+    return column.type.value_type if pa.types.is_dictionary(column.type) else column.type
+
+def _coerce_value(column: pa.ChunkedArray, value: Any) -> Any:
+    """Converte o valor do filtro para o tipo da coluna quando possível"""
+    try:
+        return pa.scalar(value).cast(_value_type(column))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return value
+
+def _coerce_values(column: pa.ChunkedArray, values: List[Any]) -> pa.Array:
+    """Converte a lista de valores do filtro 'in' para o tipo da coluna"""
+    array = pa.array(values)
+    try:
+        return array.cast(_value_type(column))
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+        return array
+
+def _to_records(table: pa.Table) -> List[Dict[str, Any]]:
+    """Converte a tabela em registros, formatando os timestamps sem fuso em lote"""
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type) and field.type.tz is None:
+            seconds = table.column(i).cast(pa.timestamp('s'), safe=False)
+            table = table.set_column(i, field.name, pc.strftime(seconds, format='%Y-%m-%dT%H:%M:%S'))
+    return table.to_pylist()
+
+def _match_substring(column: Union[pa.Array, pa.ChunkedArray], pattern: str) -> Union[pa.Array, pa.ChunkedArray]:
+    """Busca substring sem diferenciar maiúsculas/minúsculas"""
+    if pa.types.is_dictionary(column.type):
+        # Testa só os valores distintos do dicionário e propaga pelos índices
+        chunks = []
+        for chunk in column.chunks:
+            dictionary = chunk.dictionary
+            if not _is_string(dictionary.type):
+                dictionary = dictionary.cast(pa.string())
+            hits = pc.match_substring(dictionary, pattern, ignore_case=True)
+            chunks.append(hits.take(chunk.indices))
+        return pa.chunked_array(chunks, type=pa.bool_())
+    
+    if not _is_string(column.type):
+        column = column.cast(pa.string())
+    return pc.match_substring(column, pattern, ignore_case=True)
+
+def _between(column: pa.ChunkedArray, value: Any, value2: Any) -> pa.ChunkedArray:
+    """Máscara do operador 'between' (intervalo fechado)"""
+    if value2 is None:
+        raise ValueError("Operação 'between' requer value2")
+    return pc.and_(
+        pc.greater_equal(column, _coerce_value(column, value)),
+        pc.less_equal(column, _coerce_value(column, value2))
+    )
+
+# Operadores do /filter mapeados para as funções que geram a máscara
+_OPS: Dict[str, Callable[[pa.ChunkedArray, Any, Any], pa.ChunkedArray]] = {
+    "eq": lambda col, v, _: pc.equal(col, _coerce_value(col, v)),
+    "gt": lambda col, v, _: pc.greater(col, _coerce_value(col, v)),
+    "lt": lambda col, v, _: pc.less(col, _coerce_value(col, v)),
+    "gte": lambda col, v, _: pc.greater_equal(col, _coerce_value(col, v)),
+    "lte": lambda col, v, _: pc.less_equal(col, _coerce_value(col, v)),
+    "in": lambda col, v, _: pc.is_in(col, value_set=_coerce_values(col, v)),
+    "between": _between,
+    "contains": lambda col, v, _: _match_substring(col, str(v))
+}
+
+def _take_rows(table: pa.Table, row_ids: List[np.ndarray], limit: Optional[int]) -> pa.Table:
+    """Seleciona as linhas dos índices invertidos, na ordem original"""
+    if limit:
+        # As posições de cada valor já estão em ordem; só as primeiras podem entrar no limite
+        row_ids = [ids[:limit] for ids in row_ids]
+    row_ids = np.sort(np.concatenate(row_ids)) if row_ids else np.array([], dtype=np.int64)
+    if limit:
+        row_ids = row_ids[:limit]
+    
+    # take em cada lote: no ChunkedArray o Arrow concatena a coluna inteira antes do take
+    batches = table.to_batches()
+    offsets = np.cumsum([0] + [batch.num_rows for batch in batches])
+    bounds = np.searchsorted(row_ids, offsets)
+    parts = [
+        batch.take(pa.array(row_ids[start:end] - offset))
+        for batch, offset, start, end in zip(batches, offsets, bounds[:-1], bounds[1:])
+        if end > start
+    ]
+    return pa.Table.from_batches(parts, schema=table.schema)
 
-def apply_filter(df: pd.DataFrame, filter_req: FilterRequest) -> pd.DataFrame:
-    """Aplica filtros no DataFrame"""
+def apply_filter(table: pa.Table, filter_req: FilterRequest) -> pa.Table:
+    """Aplica filtros na tabela Arrow com kernels vetorizados"""
     try:
         column = filter_req.column
         operator = filter_req.operator.lower()
         value = filter_req.value
         value2 = filter_req.value2
         
-        if column not in df.columns:
+        if column not in app.state.meta.dtypes:
             raise ValueError(f"Coluna '{column}' não existe")
         
-        # Converte valores para o tipo correto da coluna
-        col_dtype = df[column].dtype
-        
-        if operator == "eq":
-            filtered_df = df[df[column] == value]
-        elif operator == "gt":
-            filtered_df = df[df[column] > value]
-        elif operator == "lt":
-            filtered_df = df[df[column] < value]
-        elif operator == "gte":
-            filtered_df = df[df[column] >= value]
-        elif operator == "lte":
-            filtered_df = df[df[column] <= value]
-        elif operator == "in":
-            if isinstance(value, str):
-                value = [v.strip() for v in value.split(",")]
-            filtered_df = df[df[column].isin(value)]
-        elif operator == "between":
-            if value2 is None:
-                raise ValueError("Operação 'between' requer value2")
-            filtered_df = df[(df[column] >= value) & (df[column] <= value2)]
-        elif operator == "contains":
-            filtered_df = df[df[column].astype(str).str.contains(str(value), case=False, na=False)]
-        else:
+        if operator not in _OPS:
             raise ValueError(f"Operador '{operator}' não suportado")
         
-        return filtered_df.head(filter_req.limit) if filter_req.limit else filtered_df
+        col = table.column(column)
+        
+        if operator == "in" and isinstance(value, str):
+            value = [v.strip() for v in value.split(",")]
+        
+        if operator in ("eq", "in") and column in app.state.indices:
+            # Consulta o índice invertido em vez de varrer a coluna inteira
+            index = app.state.indices[column]
+            keys = dict.fromkeys(_coerce_values(col, [value] if operator == "eq" else value).to_pylist())
+            return _take_rows(table, [index[key] for key in keys if key in index], filter_req.limit)
+        
+        if operator == "contains" and column in app.state.indices:
+            # Busca só entre os valores distintos do índice, sem converter a coluna inteira
+            index = app.state.indices[column]
+            keys = list(index)
+            hits = _match_substring(pa.array(keys), str(value)).to_pylist()
+            return _take_rows(table, [index[key] for key, hit in zip(keys, hits) if hit], filter_req.limit)
+        
+        mask = _OPS[operator](col, value, value2)
+        
+        matches = pc.sum(mask).as_py() or 0
+        multi_chunk = table.num_columns and table.column(0).num_chunks > 1
+        if filter_req.limit and (multi_chunk or matches > max(filter_req.limit, table.num_rows * TAKE_SELECTIVITY_RATIO)):
+            # Evita materializar todas as linhas filtradas quando só as primeiras serão devolvidas
+            row_ids = pc.indices_nonzero(mask).slice(0, filter_req.limit).to_numpy().astype(np.int64)
+            return _take_rows(table, [row_ids], filter_req.limit)
+        
+        filtered = table.filter(mask)
+        return filtered.slice(0, filter_req.limit) if filter_req.limit else filtered
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no filtro: {str(e)}")
 
 @app.get("/")
-def root():
+async def root():
     """Endpoint raiz com informações da API"""
     return {
         "message": "Taxi Data Analysis API",
@@ -163,8 +399,8 @@ def root():
             "/": "Informações da API",
             "/health": "Status da API e dados",
             "/columns": "Informações das colunas",
-            "/preview": "Visualizar dados (limite: 100)",
-            "/filter": "Filtrar dados (POST)",
+            "/preview": "Visualizar dados (limite: 100, ?format=arrow para Arrow IPC)",
+            "/filter": "Filtrar dados (POST, ?format=arrow para Arrow IPC)",
             "/stats": "Estatísticas (POST)",
             "/summary": "Resumo dos dados",
             "/unique/{column}": "Valores únicos de uma coluna"
@@ -172,17 +408,17 @@ def root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Verifica se a API e os dados estão acessíveis"""
     try:
-        df = load_parquet_data()
+        meta = app.state.meta
         return {
             "status": "healthy",
             "data_loaded": True,
-            "records_count": len(df),
-            "columns_count": len(df.columns),
-            "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
-            "columns": list(df.columns)
+            "records_count": meta.records_count,
+            "columns_count": len(meta.columns),
+            "memory_usage_mb": meta.memory_usage_mb,
+            "columns": meta.columns
         }
     except Exception as e:
         return {
@@ -191,35 +427,14 @@ def health_check():
         }
 
 @app.get("/columns")
-def get_columns():
+async def get_columns():
     """Retorna informações sobre as colunas disponíveis"""
     try:
-        df = load_parquet_data()
-        columns_info = []
-        
-        for col in df.columns:
-            col_info = {
-                "name": col,
-                "dtype": str(df[col].dtype),
-                "non_null_count": int(df[col].count()),
-                "null_count": int(df[col].isnull().sum()),
-                "unique_count": int(df[col].nunique())
-            }
-            
-            # Adiciona estatísticas específicas por tipo
-            if pd.api.types.is_numeric_dtype(df[col]):
-                col_info.update({
-                    "min": float(df[col].min()) if not pd.isna(df[col].min()) else None,
-                    "max": float(df[col].max()) if not pd.isna(df[col].max()) else None,
-                    "mean": float(df[col].mean()) if not pd.isna(df[col].mean()) else None
-                })
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                col_info.update({
-                    "min_date": str(df[col].min()) if not pd.isna(df[col].min()) else None,
-                    "max_date": str(df[col].max()) if not pd.isna(df[col].max()) else None
-                })
-            
-            columns_info.append(col_info)
+        meta = app.state.meta
+        columns_info = [
+            {"name": col, **meta.column_stats[col]}
+            for col in meta.columns
+        ]
         
         return {
             "columns": columns_info,
@@ -229,105 +444,100 @@ def get_columns():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter informações das colunas: {str(e)}")
 
-@app.get("/preview")
-def preview(limit: int = Query(10, ge=1, le=100)):
+def _preview(limit: int, format: str = "json"):
     """Visualiza os primeiros registros dos dados"""
     try:
-        df = load_parquet_data()
-        preview_df = df.head(limit)
-        
-        # Converte DataFrame para formato JSON-serializable
-        result = []
-        for _, row in preview_df.iterrows():
-            row_dict = {}
-            for col, val in row.items():
-                if pd.isna(val):
-                    row_dict[col] = None
-                elif isinstance(val, (np.int64, np.int32)):
-                    row_dict[col] = int(val)
-                elif isinstance(val, (np.float64, np.float32)):
-                    row_dict[col] = float(val)
-                elif isinstance(val, pd.Timestamp):
-                    row_dict[col] = val.isoformat()
-                else:
-                    row_dict[col] = str(val)
-            result.append(row_dict)
+        table = app.state.table
         
-        return {
+        if format == "arrow":
+            return _arrow_response(table.slice(0, limit))
+        
+        # Arrow converte nulos e números direto para tipos Python
+        result = _to_records(table.slice(0, limit))
+        
+        # Retorna a resposta diretamente para evitar o jsonable_encoder do FastAPI
+        return NumpyORJSONResponse({
             "data": result,
-            "total_records": len(df),
+            "total_records": table.num_rows,
             "preview_count": len(result),
-            "columns": list(df.columns)
-        }
+            "columns": table.column_names
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no preview: {str(e)}")
 
-@app.post("/filter")
-def filter_data(filter_req: FilterRequest):
+@app.get("/preview")
+async def preview(
+    limit: int = Query(10, ge=1, le=100),
+    format: Literal["json", "arrow"] = Query("json")
+):
+    """Visualiza os primeiros registros dos dados"""
+    return await run_in_threadpool(_preview, limit, format)
+
+def _filter_data(filter_req: FilterRequest, format: str = "json"):
     """Filtra dados baseado nos critérios fornecidos"""
     try:
-        df = load_parquet_data()
-        filtered_df = apply_filter(df, filter_req)
-        
-        # Converte para formato JSON-serializable
-        result = []
-        for _, row in filtered_df.iterrows():
-            row_dict = {}
-            for col, val in row.items():
-                if pd.isna(val):
-                    row_dict[col] = None
-                elif isinstance(val, (np.int64, np.int32)):
-                    row_dict[col] = int(val)
-                elif isinstance(val, (np.float64, np.float32)):
-                    row_dict[col] = float(val)
-                elif isinstance(val, pd.Timestamp):
-                    row_dict[col] = val.isoformat()
-                else:
-                    row_dict[col] = str(val)
-            result.append(row_dict)
+        table = app.state.table
+        filtered = apply_filter(table, filter_req)
         
-        return {
+        if format == "arrow":
+            return _arrow_response(filtered)
+        
+        result = _to_records(filtered)
+        
+        return NumpyORJSONResponse({
             "data": result,
-            "filtered_count": len(filtered_df),
-            "total_records": len(df),
+            "filtered_count": filtered.num_rows,
+            "total_records": table.num_rows,
             "filter_applied": {
                 "column": filter_req.column,
                 "operator": filter_req.operator,
                 "value": filter_req.value,
                 "value2": filter_req.value2
             }
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no filtro: {str(e)}")
 
-@app.post("/stats")
-def get_statistics(stats_req: StatsRequest):
+@app.post("/filter")
+async def filter_data(filter_req: FilterRequest, format: Literal["json", "arrow"] = Query("json")):
+    """Filtra dados baseado nos critérios fornecidos"""
+    return await run_in_threadpool(_filter_data, filter_req, format)
+
+def _get_statistics(stats_req: StatsRequest):
     """Calcula estatísticas para colunas especificadas"""
     try:
-        df = load_parquet_data()
+        meta = app.state.meta
         
         # Verifica se as colunas existem
         for col in stats_req.columns:
-            if col not in df.columns:
+            if col not in meta.dtypes:
                 raise ValueError(f"Coluna '{col}' não existe")
         
+        if stats_req.group_by and stats_req.group_by not in meta.dtypes:
+            raise ValueError(f"Coluna de agrupamento '{stats_req.group_by}' não existe")
+        
+        # Converte apenas as colunas envolvidas no cálculo
+        needed_cols = list(dict.fromkeys(stats_req.columns + ([stats_req.group_by] if stats_req.group_by else [])))
+        df = _to_pandas(needed_cols)
+        
         result = {}
         
         if stats_req.group_by:
-            if stats_req.group_by not in df.columns:
-                raise ValueError(f"Coluna de agrupamento '{stats_req.group_by}' não existe")
-            
-            grouped = df.groupby(stats_req.group_by)
-            for col in stats_req.columns:
-                if pd.api.types.is_numeric_dtype(df[col]):
+            numeric_cols = [col for col in stats_req.columns if col in meta.numeric_cols]
+            if numeric_cols:
+                # Uma única agregação agrupada para todas as colunas numéricas
+                aggregated = df.groupby(stats_req.group_by, observed=True, sort=False)[numeric_cols].agg(
+                    ['count', 'mean', 'min', 'max', 'std']
+                )
+                for col in numeric_cols:
                     result[col] = {
-                        "by_group": grouped[col].agg(['count', 'mean', 'min', 'max', 'std']).to_dict()
+                        "by_group": aggregated[col].to_dict()
                     }
         else:
             for col in stats_req.columns:
-                if pd.api.types.is_numeric_dtype(df[col]):
+                if col in meta.numeric_cols:
                     result[col] = {
                         "count": int(df[col].count()),
                         "mean": float(df[col].mean()),
@@ -356,38 +566,38 @@ def get_statistics(stats_req: StatsRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro no cálculo de estatísticas: {str(e)}")
 
+@app.post("/stats")
+async def get_statistics(stats_req: StatsRequest):
+    """Calcula estatísticas para colunas especificadas"""
+    return await run_in_threadpool(_get_statistics, stats_req)
+
 @app.get("/summary")
-def get_summary():
+async def get_summary():
     """Retorna um resumo geral dos dados"""
     try:
-        df = load_parquet_data()
-        
-        numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-        categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
-        datetime_columns = df.select_dtypes(include=['datetime64[ns]']).columns.tolist()
+        meta = app.state.meta
         
         summary = {
-            "total_records": len(df),
-            "total_columns": len(df.columns),
-            "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+            "total_records": meta.records_count,
+            "total_columns": len(meta.columns),
+            "memory_usage_mb": meta.memory_usage_mb,
             "column_types": {
-                "numeric": len(numeric_columns),
-                "categorical": len(categorical_columns),
-                "datetime": len(datetime_columns)
+                "numeric": len(meta.numeric_cols),
+                "categorical": len(meta.categorical_cols),
+                "datetime": len(meta.datetime_cols)
             },
             "missing_data": {
-                col: int(df[col].isnull().sum()) 
-                for col in df.columns if df[col].isnull().sum() > 0
+                col: count for col, count in meta.null_counts.items() if count > 0
             },
             "date_range": {}
         }
         
         # Adiciona informações de intervalo de datas
-        for col in datetime_columns:
-            if not df[col].isnull().all():
+        for col in meta.datetime_cols:
+            if meta.column_stats[col]["non_null_count"] > 0:
                 summary["date_range"][col] = {
-                    "start": str(df[col].min()),
-                    "end": str(df[col].max())
+                    "start": meta.column_stats[col]["min_date"],
+                    "end": meta.column_stats[col]["max_date"]
                 }
         
         return summary
@@ -395,300 +605,53 @@ def get_summary():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no resumo: {str(e)}")
 
-@app.get("/unique/{column}")
-def get_unique_values(column: str, limit: int = Query(100, ge=1, le=1000)):
+def _dictionary_value_counts(column: pa.ChunkedArray, limit: int):
+    """Conta os valores de uma coluna dicionário com bincount sobre os índices"""
+    array = column.combine_chunks()
+    counts = np.bincount(pc.drop_null(array.indices).to_numpy(), minlength=len(array.dictionary))
+    total_unique = int(np.count_nonzero(counts))
+    
+    # Seleciona os k mais frequentes sem ordenar todas as contagens
+    k = min(limit, total_unique)
+    top = np.argpartition(-counts, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    top = top[np.argsort(-counts[top], kind="stable")]
+    
+    unique_values = dict(zip(array.dictionary.take(top).to_pylist(), counts[top].tolist()))
+    return unique_values, total_unique
+
+def _get_unique_values(column: str, limit: int):
     """Retorna valores únicos de uma coluna"""
     try:
-        df = load_parquet_data()
+        table = app.state.table
         
-        if column not in df.columns:
+        if column not in app.state.meta.dtypes:
             raise HTTPException(status_code=404, detail=f"Coluna '{column}' não encontrada")
         
-        unique_values = df[column].value_counts().head(limit)
+        if column in app.state.value_counts:
+            value_counts = app.state.value_counts[column]
+            unique_values, total_unique = value_counts.head(limit).to_dict(), len(value_counts)
+        elif pa.types.is_dictionary(table.schema.field(column).type):
+            unique_values, total_unique = _dictionary_value_counts(table.column(column), limit)
+        else:
+            value_counts = table.column(column).to_pandas().value_counts()
+            unique_values, total_unique = value_counts.head(limit).to_dict(), len(value_counts)
         
         return {
             "column": column,
-            "unique_values": unique_values.to_dict(),
-            "total_unique": int(df[column].nunique()),
+            "unique_values": unique_values,
+            "total_unique": total_unique,
             "showing": len(unique_values)
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter valores únicos: {str(e)}")
 
-if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("API_PORT", 8001))
-    uvicorn.run(app, host="0.0.0.0", port=port)
-    operator: str  # eq, gt, lt, gte, lte, in
-    value: str
-    limit: Optional[int] = 1000
-
-def load_parquet_data():
-    """Carrega dados do Parquet com tratamento de erros"""
-    try:
-        # Verifica se é um diretório de arquivos Parquet
-        if os.path.isdir(PARQUET_PATH):
-            print(f"Lendo diretório Parquet: {PARQUET_PATH}")
-            df = pd.read_parquet(PARQUET_PATH)
-        else:
-            # Procura por arquivos Parquet na pasta
-            parquet_files = glob.glob(os.path.join(os.path.dirname(PARQUET_PATH), "*.parquet"))
-            if parquet_files:
-                print(f"Lendo arquivo Parquet: {parquet_files[0]}")
-                df = pd.read_parquet(parquet_files[0])
-            else:
-                raise FileNotFoundError(f"Nenhum arquivo Parquet encontrado em {PARQUET_PATH}")
-        
-        # Converte tipos de dados problemáticos
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    # Tenta converter strings para datetime se aplicável
-                    if 'datetime' in col.lower():
-                        df[col] = pd.to_datetime(df[col], errors='ignore')
-                except:
-                    pass
-        
-        print(f"Dados carregados: {len(df)} registros, {len(df.columns)} colunas")
-        return df
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao carregar dados: {str(e)}")
-
-@app.get("/")
-def root():
-    """Endpoint raiz com informações da API"""
-    return {
-        "message": "Taxi Data Analysis API",
-        "version": "1.0.0",
-        "endpoints": ["/preview", "/filter", "/stats", "/columns", "/health"]
-    }
-
-@app.get("/health")
-def health_check():
-    """Verifica se a API e os dados estão acessíveis"""
-    try:
-        df = load_parquet_data()
-        return {
-            "status": "healthy",
-            "data_loaded": True,
-            "records_count": len(df),
-            "columns_count": len(df.columns)
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e)
-        }
-
-@app.get("/columns")
-def get_columns():
-    """Retorna informações sobre as colunas disponíveis"""
-    try:
-        df = load_parquet_data()
-        columns_info = []
-        
-        for col in df.columns:
-            col_info = {
-                "name": col,
-                "type": str(df[col].dtype),
-                "non_null_count": int(df[col].count()),
-                "null_count": int(df[col].isnull().sum())
-            }
-            
-            # Adiciona estatísticas para colunas numéricas
-            if df[col].dtype in ['int64', 'float64']:
-                col_info.update({
-                    "min": float(df[col].min()) if not pd.isna(df[col].min()) else None,
-                    "max": float(df[col].max()) if not pd.isna(df[col].max()) else None,
-                    "mean": float(df[col].mean()) if not pd.isna(df[col].mean()) else None
-                })
-            
-            columns_info.append(col_info)
-        
-        return {"columns": columns_info}
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao obter informações das colunas: {str(e)}")
-
-@app.get("/preview")
-def preview(limit: int = Query(10, ge=1, le=100)):
-    """Retorna os primeiros registros"""
-    try:
-        df = load_parquet_data()
-        
-        # Converte timestamps para string para serialização JSON
-        df_preview = df.head(limit).copy()
-        for col in df_preview.columns:
-            if df_preview[col].dtype == 'datetime64[ns]':
-                df_preview[col] = df_preview[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        return {
-            "total_records": len(df),
-            "preview_count": len(df_preview),
-            "data": df_preview.to_dict(orient="records")
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao carregar preview: {str(e)}")
-
-@app.get("/stats")
-def get_statistics():
-    """Retorna estatísticas básicas dos dados"""
-    try:
-        df = load_parquet_data()
-        
-        stats = {
-            "total_records": len(df),
-            "total_columns": len(df.columns),
-            "memory_usage_mb": round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2)
-        }
-        
-        # Estatísticas por tipo de coluna
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns.tolist()
-        
-        if numeric_cols:
-            stats["numeric_columns"] = len(numeric_cols)
-            stats["numeric_stats"] = df[numeric_cols].describe().round(2).to_dict()
-        
-        if datetime_cols:
-            stats["datetime_columns"] = len(datetime_cols)
-            for col in datetime_cols:
-                stats[f"{col}_range"] = {
-                    "min": df[col].min().strftime('%Y-%m-%d %H:%M:%S') if not pd.isna(df[col].min()) else None,
-                    "max": df[col].max().strftime('%Y-%m-%d %H:%M:%S') if not pd.isna(df[col].max()) else None
-                }
-        
-        return stats
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao calcular estatísticas: {str(e)}")
-
-@app.get("/filter")
-def filter_data(
-    column: str = Query(..., description="Nome da coluna para filtrar"),
-    operator: str = Query("eq", description="Operador: eq, gt, lt, gte, lte, in, contains"),
-    value: str = Query(..., description="Valor para filtrar"),
-    limit: int = Query(1000, ge=1, le=10000, description="Limite de registros retornados")
-):
-    """Filtra os dados por coluna e valor com operadores avançados"""
-    try:
-        df = load_parquet_data()
-        
-        # Verifica se a coluna existe
-        if column not in df.columns:
-            raise HTTPException(status_code=400, detail=f"Coluna '{column}' não encontrada")
-        
-        # Aplica o filtro baseado no operador
-        if operator == "eq":
-            # Converte o valor para o tipo correto da coluna
-            if df[column].dtype in ['int64', 'float64']:
-                try:
-                    value = float(value)
-                    if df[column].dtype == 'int64':
-                        value = int(value)
-                except ValueError:
-                    raise HTTPException(status_code=400, detail=f"Valor '{value}' inválido para coluna numérica")
-            df_filtered = df[df[column] == value]
-            
-        elif operator == "gt":
-            value = float(value)
-            df_filtered = df[df[column] > value]
-            
-        elif operator == "lt":
-            value = float(value)
-            df_filtered = df[df[column] < value]
-            
-        elif operator == "gte":
-            value = float(value)
-            df_filtered = df[df[column] >= value]
-            
-        elif operator == "lte":
-            value = float(value)
-            df_filtered = df[df[column] <= value]
-            
-        elif operator == "in":
-            values = [v.strip() for v in value.split(",")]
-            # Converte para tipo correto se numérico
-            if df[column].dtype in ['int64', 'float64']:
-                values = [float(v) for v in values]
-                if df[column].dtype == 'int64':
-                    values = [int(v) for v in values]
-            df_filtered = df[df[column].isin(values)]
-            
-        elif operator == "contains":
-            if df[column].dtype == 'object':
-                df_filtered = df[df[column].str.contains(value, case=False, na=False)]
-            else:
-                raise HTTPException(status_code=400, detail="Operador 'contains' só funciona com colunas de texto")
-                
-        else:
-            raise HTTPException(status_code=400, detail=f"Operador '{operator}' não suportado")
-        
-        # Limita os resultados
-        df_result = df_filtered.head(limit)
-        
-        # Converte timestamps para string
-        for col in df_result.columns:
-            if df_result[col].dtype == 'datetime64[ns]':
-                df_result[col] = df_result[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        return {
-            "filter_applied": f"{column} {operator} {value}",
-            "total_matches": len(df_filtered),
-            "returned_count": len(df_result),
-            "data": df_result.to_dict(orient="records")
-        }
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao filtrar dados: {str(e)}")
-
-@app.post("/filter_advanced")
-def filter_advanced(filters: List[FilterRequest]):
-    """Aplica múltiplos filtros aos dados"""
-    try:
-        df = load_parquet_data()
-        
-        for filter_req in filters:
-            column = filter_req.column
-            operator = filter_req.operator
-            value = filter_req.value
-            
-            if column not in df.columns:
-                raise HTTPException(status_code=400, detail=f"Coluna '{column}' não encontrada")
-            
-            # Aplica filtros similares ao endpoint anterior
-            if operator == "eq":
-                if df[column].dtype in ['int64', 'float64']:
-                    value = float(value)
-                    if df[column].dtype == 'int64':
-                        value = int(value)
-                df = df[df[column] == value]
-            # ... outros operadores similares
-        
-        limit = filters[0].limit if filters else 1000
-        df_result = df.head(limit)
-        
-        # Converte timestamps
-        for col in df_result.columns:
-            if df_result[col].dtype == 'datetime64[ns]':
-                df_result[col] = df_result[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        return {
-            "filters_applied": len(filters),
-            "total_matches": len(df),
-            "returned_count": len(df_result),
-            "data": df_result.to_dict(orient="records")
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao aplicar filtros: {str(e)}")
+@app.get("/unique/{column}")
+async def get_unique_values(column: str, limit: int = Query(100, ge=1, le=1000)):
+    """Retorna valores únicos de uma coluna"""
+    return await run_in_threadpool(_get_unique_values, column, limit)
 
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("API_PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    port = int(os.getenv("API_PORT", 8001))
+    uvicorn.run(app, host="0.0.0.0", port=port, limit_concurrency=64)
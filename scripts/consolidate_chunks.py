@@ -1,12 +1,19 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import os
 import shutil
 from glob import glob
 from dotenv import load_dotenv
 import time
 
+# Linhas por lote lido durante a consolidação
+BATCH_SIZE = 65536
+# Linhas por row group do arquivo consolidado
+ROW_GROUP_SIZE = 256_000
+
 def consolidate_chunks_and_cleanup():
-    """Consolida chunks um por vez e deleta cada um após processar"""
+    """Consolida os chunks em streaming e deleta-os após gravar o arquivo final"""
     
     # Carrega variáveis do .env
     load_dotenv()
@@ -20,7 +27,7 @@ def consolidate_chunks_and_cleanup():
     
     # Encontra todas as pastas de chunks
     chunk_pattern = f"{PARQUET_PATH}/chunk_*"
-    chunk_folders = glob(chunk_pattern)
+    chunk_folders = sorted(glob(chunk_pattern))
     
     if not chunk_folders:
         print(f"Nenhum chunk encontrado no padrão: {chunk_pattern}")
@@ -28,70 +35,69 @@ def consolidate_chunks_and_cleanup():
     
     print(f"Encontrados {len(chunk_folders)} chunks para consolidar")
     
-    all_data = []
-    total_records = 0
-    
-    # Processa cada chunk individualmente
-    for i, chunk_folder in enumerate(sorted(chunk_folders), 1):
-        print(f"[{i}/{len(chunk_folders)}] Processando: {chunk_folder}")
-        
-        try:
-            # Encontra arquivos .parquet dentro da pasta do chunk
-            parquet_files = glob(f"{chunk_folder}/*.parquet")
-            
-            if not parquet_files:
-                continue
-            
-            # Lê o arquivo parquet
-            parquet_file = parquet_files[0]
-            df_chunk = pd.read_parquet(parquet_file)
-            
-            print(f"✅ {len(df_chunk):,} registros carregados")
-            
-            # Adiciona aos dados consolidados
-            all_data.append(df_chunk)
-            total_records += len(df_chunk)
-            
-            # DELETA O CHUNK IMEDIATAMENTE APÓS PROCESSAR
-            shutil.rmtree(chunk_folder)
-            print(f"🗑️ Chunk removido: {os.path.basename(chunk_folder)}")
-            
-        except Exception as e:
-            print(f"❌ Erro ao processar {chunk_folder}: {e}")
-            continue
+    # Coleta os arquivos .parquet de todos os chunks
+    parquet_files = []
+    for i, chunk_folder in enumerate(chunk_folders, 1):
+        chunk_files = sorted(glob(f"{chunk_folder}/*.parquet"))
+        print(f"[{i}/{len(chunk_folders)}] {chunk_folder}: {len(chunk_files)} arquivo(s)")
+        parquet_files.extend(chunk_files)
     
-    if not all_data:
+    if not parquet_files:
         return None
     
-    print(f"Consolidando {len(all_data)} chunks...")
+    # Define o caminho do arquivo consolidado
+    consolidated_path = f"{PARQUET_PATH}_consolidated.parquet"
+    
+    print(f"Consolidando {len(parquet_files)} arquivos em streaming...")
     
     try:
-        df_final = pd.concat(all_data, ignore_index=True)
+        # Lê os chunks como um único dataset, em lotes, sem carregar tudo em memória
+        dataset = ds.dataset(parquet_files, format="parquet")
+        total_records = 0
         
-        # Define o caminho do arquivo consolidado
-        consolidated_path = f"{PARQUET_PATH}_consolidated.parquet"
-        
-        # Salva o arquivo consolidado
-        df_final.to_parquet(
-            consolidated_path, 
-            compression='snappy',
-            index=False
-        )
-        
-        print(f"✅ Arquivo consolidado salvo: {consolidated_path}")
-        
-        # Remove a pasta principal de chunks se estiver vazia
-        try:
-            if os.path.exists(PARQUET_PATH) and not os.listdir(PARQUET_PATH):
-                os.rmdir(PARQUET_PATH)
-        except:
-            pass
+        with pq.ParquetWriter(
+            consolidated_path,
+            dataset.schema,
+            compression="zstd",
+            compression_level=3,
+            use_dictionary=True,
+            write_statistics=True,
+            data_page_size=1 << 20
+        ) as writer:
+            # Acumula lotes até completar um row group para não gerar row groups pequenos
+            pending = pa.Table.from_batches([], schema=dataset.schema)
+            for batch in dataset.to_batches(batch_size=BATCH_SIZE):
+                pending = pa.concat_tables([pending, pa.Table.from_batches([batch])])
+                while pending.num_rows >= ROW_GROUP_SIZE:
+                    writer.write_table(pending.slice(0, ROW_GROUP_SIZE), row_group_size=ROW_GROUP_SIZE)
+                    pending = pending.slice(ROW_GROUP_SIZE)
+                total_records += batch.num_rows
+            
+            if pending.num_rows:
+                writer.write_table(pending, row_group_size=ROW_GROUP_SIZE)
         
-        return consolidated_path
+        print(f"✅ Arquivo consolidado salvo: {consolidated_path} ({total_records:,} registros)")
         
     except Exception as e:
         print(f"❌ Erro durante a consolidação: {e}")
+        # Remove o arquivo parcial; os chunks continuam intactos
+        if os.path.exists(consolidated_path):
+            os.remove(consolidated_path)
         return None
+    
+    # Só remove os chunks depois que o arquivo consolidado foi fechado com sucesso
+    for chunk_folder in chunk_folders:
+        shutil.rmtree(chunk_folder)
+        print(f"🗑️ Chunk removido: {os.path.basename(chunk_folder)}")
+    
+    # Remove a pasta principal de chunks se estiver vazia
+    try:
+        if os.path.exists(PARQUET_PATH) and not os.listdir(PARQUET_PATH):
+            os.rmdir(PARQUET_PATH)
+    except:
+        pass
+    
+    return consolidated_path
 
 def main():
     consolidated_path = consolidate_chunks_and_cleanup()
@@ -1,6 +1,6 @@
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.types import *
+from pyspark.sql.functions import col, floor, lit, month, to_timestamp, unix_timestamp
+from pyspark.sql.types import StructType, StructField, IntegerType, DoubleType, StringType
 import os
 import glob
 from dotenv import load_dotenv
@@ -9,6 +9,28 @@ load_dotenv()
 CSV_PATH = os.getenv("CSV_PATH")
 PARQUET_PATH = os.getenv("PARQUET_PATH")
 
+# Determina o caminho base do projeto (scripts está um nível abaixo da raiz)
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+csv_pattern = os.path.join(project_root, "data", "split_raw", "*.csv")
+
+# Staging em Parquet: o CSV é convertido uma única vez e as execuções seguintes
+# leem o formato colunar (apague o diretório para reconverter)
+staged_path = os.getenv("STAGED_PATH") or os.path.join(project_root, "data", "staged", "taxi_raw.parquet")
+# Só o _SUCCESS indica staging completo; uma escrita interrompida deixa o diretório parcial
+needs_staging = not os.path.exists(os.path.join(staged_path, "_SUCCESS"))
+
+# Valida a entrada antes de subir a sessão Spark
+if needs_staging:
+    csv_files = glob.glob(csv_pattern)
+    
+    print(f"Tentando ler arquivos de: {csv_pattern}")
+    print(f"Diretório atual: {os.getcwd()}")
+    print(f"Arquivos encontrados: {len(csv_files)}")
+    print(f"Primeiros arquivos: {csv_files[:3]}")
+    
+    if not csv_files:
+        raise FileNotFoundError(f"Nenhum arquivo CSV encontrado em: {csv_pattern}")
+
 # Configuração da sessão Spark otimizada
 spark = SparkSession.builder \
     .appName("TaxiDataProcessing") \
@@ -19,9 +41,13 @@ spark = SparkSession.builder \
     .config("spark.sql.adaptive.enabled", "true") \
     .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
     .config("spark.sql.adaptive.coalescePartitions.minPartitionSize", "64MB") \
-    .config("spark.sql.adaptive.advisoryPartitionSizeInBytes", "128MB") \
+    .config("spark.sql.adaptive.advisoryPartitionSizeInBytes", "256MB") \
+    .config("spark.sql.files.maxPartitionBytes", "268435456") \
+    .config("spark.sql.files.openCostInBytes", "4194304") \
+    .config("spark.sql.parquet.enableVectorizedReader", "true") \
     .config("spark.serializer", "org.apache.spark.serializer.KryoSerializer") \
     .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+    .config("spark.sql.session.timeZone", "UTC") \
     .getOrCreate()
 
 spark.sparkContext.setLogLevel("WARN")
@@ -47,74 +73,68 @@ schema = StructType([
     StructField("total_amount", DoubleType(), True)
 ])
 
-# Determina o caminho base do projeto (scripts está um nível abaixo da raiz)
-project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-csv_pattern = os.path.join(project_root, "data", "split_raw", "*.csv")
-csv_files = glob.glob(csv_pattern)
-
-print(f"Tentando ler arquivos de: {csv_pattern}")
-print(f"Diretório atual: {os.getcwd()}")
-print(f"Arquivos encontrados: {len(csv_files)}")
-print(f"Primeiros arquivos: {csv_files[:3]}")
-
-# Lê o dataset com schema aplicado - usando arquivos divididos para processamento paralelo
-df = spark.read.option("header", True).schema(schema).csv(csv_files).repartition(20)
-
-#1: Filtra dados inválidos ANTES das transformações pesadas
-df_filtered_early = df.filter(
-    col("tpep_pickup_datetime").isNotNull() &
-    col("tpep_dropoff_datetime").isNotNull() &
-    col("passenger_count").isNotNull() &
-    col("trip_distance").isNotNull() &
-    col("fare_amount").isNotNull() &
-    (col("passenger_count") >= 1) & (col("passenger_count") <= 8) &
+if needs_staging:
+    print(f"Convertendo CSV para Parquet de staging em: {staged_path}")
+    # O parse AM/PM (formatter lento) também acontece só aqui; o staging guarda timestamps
+    # A listagem dos arquivos fica com o próprio Spark a partir do padrão
+    spark.read.option("header", True).schema(schema).csv(csv_pattern) \
+        .withColumn("tpep_pickup_datetime", to_timestamp(col("tpep_pickup_datetime"), "MM/dd/yyyy hh:mm:ss a")) \
+        .withColumn("tpep_dropoff_datetime", to_timestamp(col("tpep_dropoff_datetime"), "MM/dd/yyyy hh:mm:ss a")) \
+        .write.mode("overwrite").parquet(staged_path)
+
+# Lê o staging - as partições de leitura já saem dimensionadas por maxPartitionBytes,
+# sem o shuffle extra de um repartition fixo
+# store_and_fwd_flag não é usado nem publicado; o select poda a coluna já na leitura do Parquet
+df = spark.read.parquet(staged_path).select(
+    "VendorID", "tpep_pickup_datetime", "tpep_dropoff_datetime", "passenger_count",
+    "trip_distance", "RatecodeID", "PULocationID", "DOLocationID", "payment_type",
+    "fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount",
+    "improvement_surcharge", "total_amount"
+)
+
+#1: Filtra dados inválidos ANTES das transformações pesadas: descarta nulos e
+# aplica as faixas de valores (inclusive as de data) em um único predicado
+df_filtered_early = df.dropna(subset=[
+    "tpep_pickup_datetime", "tpep_dropoff_datetime",
+    "passenger_count", "trip_distance", "fare_amount"
+]).filter(
+    col("passenger_count").between(1, 8) &
     (col("trip_distance") > 0) & (col("trip_distance") < 500) &
     (col("fare_amount") > 0) & (col("fare_amount") < 1000) &
     (col("total_amount") > 0) & (col("total_amount") < 1000) &
     (col("tip_amount") >= 0) &
-    col("RatecodeID").isin([1, 2, 3, 4, 5, 6]) &
-    col("payment_type").isin([1, 2, 3, 4, 5, 6])
-)
-
-
-#2: Transformações de timestamp com verificação
-df_with_timestamps = df_filtered_early.withColumn(
-    "tpep_pickup_datetime", 
-    to_timestamp(col("tpep_pickup_datetime"), "MM/dd/yyyy hh:mm:ss a")
-).withColumn(
-    "tpep_dropoff_datetime", 
-    to_timestamp(col("tpep_dropoff_datetime"), "MM/dd/yyyy hh:mm:ss a")
+    col("RatecodeID").between(1, 6) &
+    col("payment_type").between(1, 6) &
+    (col("tpep_pickup_datetime") < col("tpep_dropoff_datetime")) &
+    # Mesmo efeito de year(...) == 2018 nas duas colunas: como pickup < dropoff,
+    # basta limitar o início do pickup e o fim do dropoff (e o Parquet usa as estatísticas)
+    (col("tpep_pickup_datetime") >= to_timestamp(lit("2018-01-01 00:00:00"))) &
+    (col("tpep_dropoff_datetime") < to_timestamp(lit("2019-01-01 00:00:00")))
 )
 
-#3: Filtros de data logo após conversão
-df_date_filtered = df_with_timestamps.filter(
-    col("tpep_pickup_datetime").isNotNull() &
-    col("tpep_dropoff_datetime").isNotNull() &
-    (col("tpep_pickup_datetime") < col("tpep_dropoff_datetime")) &
-    (year(col("tpep_pickup_datetime")) == 2018) &
-    (year(col("tpep_dropoff_datetime")) == 2018)
+#2: Timestamps já vêm convertidos do staging; o epoch em segundos é calculado
+# uma única vez para os derivados de duração
+df_with_timestamps = df_filtered_early.select(
+    "*",
+    unix_timestamp(col("tpep_pickup_datetime")).alias("pickup_ts_long"),
+    unix_timestamp(col("tpep_dropoff_datetime")).alias("dropoff_ts_long")
 )
 
-#4: Todas as transformações em uma única operação
-df_enriched = df_date_filtered.withColumn(
-    "trip_duration_minutes", 
-    (unix_timestamp(col("tpep_dropoff_datetime")) - 
-     unix_timestamp(col("tpep_pickup_datetime"))) / 60
-).withColumn(
-    "pickup_hour", hour(col("tpep_pickup_datetime"))
-).withColumn(
-    "pickup_day_of_week", dayofweek(col("tpep_pickup_datetime"))
-).withColumn(
-    "pickup_month", month(col("tpep_pickup_datetime"))
-).withColumn(
-    "speed_mph", 
-    when(col("trip_duration_minutes") > 0, 
-         col("trip_distance") / (col("trip_duration_minutes") / 60))
-    .otherwise(0)
-).withColumn(
-    "tip_percentage",
-    when(col("fare_amount") > 0, (col("tip_amount") / col("fare_amount")) * 100)
-    .otherwise(0)
+#3: Todas as transformações em uma única projeção
+# Duração inteira em segundos; minutos só para a coluna publicada
+trip_duration_seconds = col("dropoff_ts_long") - col("pickup_ts_long")
+
+df_enriched = df_with_timestamps.select(
+    "*",
+    (trip_duration_seconds / 60).alias("trip_duration_minutes"),
+    # Com a sessão em UTC, hora e dia da semana saem direto do epoch em segundos
+    # (1970-01-01 foi quinta-feira, dia 5 na convenção 1=domingo do dayofweek)
+    floor((col("pickup_ts_long") % 86400) / 3600).cast("int").alias("pickup_hour"),
+    ((floor(col("pickup_ts_long") / 86400) + 4) % 7 + 1).cast("int").alias("pickup_day_of_week"),
+    month(col("tpep_pickup_datetime")).alias("pickup_month"),
+    # pickup < dropoff e fare_amount > 0 já são garantidos pelo filtro inicial
+    (col("trip_distance") * 3600.0 / trip_duration_seconds).alias("speed_mph"),
+    ((col("tip_amount") / col("fare_amount")) * 100).alias("tip_percentage")
 )
 
 # Filtros finais
@@ -122,16 +142,16 @@ df_final = df_enriched.filter(
     (col("trip_duration_minutes") >= 1) & (col("trip_duration_minutes") <= 480) &
     (col("speed_mph") >= 0) & (col("speed_mph") <= 80) &
     (col("tip_percentage") >= 0) & (col("tip_percentage") <= 50)
-)
+).drop("pickup_ts_long", "dropoff_ts_long")
 
-#5: Usa coalesce para gerar arquivo único
-df_final.coalesce(1).write \
+#4: Escrita em paralelo; sem shuffle no plano, cada split de leitura (256MB, cerca de
+# metade após os filtros) vira um arquivo, limitado ainda por maxRecordsPerFile
+df_final.write \
     .mode("overwrite") \
-    .option("compression", "snappy") \
+    .option("compression", "zstd") \
+    .option("parquet.compression.codec.zstd.level", "3") \
+    .option("parquet.enable.dictionary", "true") \
     .option("maxRecordsPerFile", "1000000") \
     .parquet(PARQUET_PATH)
 
-#6: Limpa cache antes de finalizar
-df_filtered_early.unpersist()
-
 spark.stop()
\ No newline at end of file